@@ -0,0 +1,154 @@
+import math
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request cannot be admitted: the wait queue is full, or the
+    request waited longer than the queue timeout for a free slot.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Server busy, please retry")
+        self.retry_after = retry_after
+
+
+class _InFlight:
+    """One computation that identical concurrent requests can share."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class AdmissionController:
+    """
+    Admission control for one expensive endpoint.
+
+    - At most `max_concurrent` computations run at the same time.
+    - Up to `max_queue` more wait (at most `queue_timeout` seconds) for a slot;
+      anything beyond that is rejected with Overloaded.
+    - Concurrent calls with the same key are collapsed into a single
+      computation and all receive its result.
+    """
+
+    def __init__(self, max_concurrent=2, max_queue=4, queue_timeout=10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = max(1, math.ceil(queue_timeout))
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._inflight = {}
+
+        # Metrics (guarded by self._cond)
+        self._admitted = 0
+        self._rejected = 0
+        self._collapsed = 0
+        self._timed_out = 0
+        self._max_queue_depth = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def run(self, key, fn):
+        """
+        Return fn() for `key`, sharing the result with any identical request
+        already in flight. Raises Overloaded if over capacity.
+        """
+        with self._cond:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlight()
+                self._inflight[key] = call
+            else:
+                self._collapsed += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            self._acquire()
+            try:
+                call.result = fn()
+            finally:
+                self._release()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._cond:
+                del self._inflight[key]
+            call.done.set()
+
+    def _acquire(self):
+        start = time.monotonic()
+        with self._cond:
+            if self._active >= self.max_concurrent:
+                if self._waiting >= self.max_queue:
+                    self._rejected += 1
+                    raise Overloaded(self.retry_after)
+
+                self._waiting += 1
+                self._max_queue_depth = max(self._max_queue_depth, self._waiting)
+                deadline = start + self.queue_timeout
+                try:
+                    while self._active >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._rejected += 1
+                            self._timed_out += 1
+                            self._record_wait(start)
+                            raise Overloaded(self.retry_after)
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._active += 1
+            self._admitted += 1
+            self._record_wait(start)
+
+    def _record_wait(self, start):
+        # Called with self._cond held, for admitted and timed-out requests alike,
+        # so wait metrics don't under-report when the endpoint is overloaded.
+        waited = time.monotonic() - start
+        self._waits += 1
+        self._wait_total += waited
+        self._wait_max = max(self._wait_max, waited)
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def metrics(self):
+        """Snapshot of current load and counters, suitable for jsonify()."""
+        with self._cond:
+            return {
+                "active": self._active,
+                "queue_depth": self._waiting,
+                "max_queue_depth": self._max_queue_depth,
+                "in_flight_keys": len(self._inflight),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "collapsed": self._collapsed,
+                "timed_out": self._timed_out,
+                "wait_seconds_total": round(self._wait_total, 6),
+                "wait_seconds_max": round(self._wait_max, 6),
+                "wait_seconds_avg": round(self._wait_total / self._waits, 6)
+                if self._waits else 0.0,
+                "limits": {
+                    "max_concurrent": self.max_concurrent,
+                    "max_queue": self.max_queue,
+                    "queue_timeout": self.queue_timeout,
+                },
+            }
@@ -3,13 +3,18 @@ import joblib
 import numpy as np
 import io
 import base64
+import threading
+import time
+from collections import OrderedDict
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
 from flask import Flask, request, jsonify
 from sklearn.cluster import KMeans
-from sklearn.datasets import load_iris
+
+from admission import AdmissionController, Overloaded
+from dataset_store import available_datasets, current_dataset, open_dataset
 
 app = Flask(__name__)
 
@@ -17,9 +22,27 @@ app = Flask(__name__)
 model_bin1 = joblib.load(os.path.join("models", "model_binary1.pkl"))  # Setosa vs Not
 model_bin2 = joblib.load(os.path.join("models", "model_binary2.pkl"))  # Versicolor vs Virginica
 
-# We'll also load the full Iris dataset for on-demand clustering
-iris_data = load_iris()
-X_iris = iris_data.data  # shape: (150, 4)
+# Clustering datasets come from the dataset store (cached float32 .npy files,
+# memory-mapped). Conversion happens inside the admitted plot computation.
+
+# Max points drawn in a cluster plot; larger datasets are subsampled for display.
+PLOT_MAX_POINTS = 5000
+# Max points K-Means is fitted on; larger datasets are fitted on a random
+# subsample so fit time and per-worker memory stay bounded.
+FIT_MAX_SAMPLES = 10000
+
+# Rendered plots, keyed by (dataset name, content hash, k).
+PLOT_CACHE_SIZE = 32
+plot_cache = OrderedDict()
+plot_cache_lock = threading.Lock()
+
+# Admission control for /plot_clusters: every call is a full KMeans fit + render,
+# so cap how many run at once and how many may queue behind them.
+plot_admission = AdmissionController(
+    max_concurrent=int(os.environ.get("PLOT_MAX_CONCURRENT", 2)),
+    max_queue=int(os.environ.get("PLOT_MAX_QUEUE", 4)),
+    queue_timeout=float(os.environ.get("PLOT_QUEUE_TIMEOUT", 10)),
+)
 
 
 @app.route('/')
@@ -573,10 +596,16 @@ def clustering_page():
                     body: JSON.stringify({ k: kVal })
                 });
                 
-                if(!response.ok) {
-                    throw new Error("Network response was not OK");
+                if(response.status === 503) {
+                    const retryAfter = response.headers.get('Retry-After') || '1';
+                    alert(`Server busy, retry in ${retryAfter} s.`);
+                    return;
                 }
                 const data = await response.json();
+                if(data.error) {
+                    alert(data.error);
+                    return;
+                }
                 // data.plot_url is a base64 data URL
                 imgEl.src = data.plot_url;
             } catch(err) {
@@ -590,11 +619,81 @@ def clustering_page():
     """
 
 
+def cached_plot(key):
+    with plot_cache_lock:
+        plot_url = plot_cache.get(key)
+        if plot_url is not None:
+            plot_cache.move_to_end(key)
+        return plot_url
+
+
+def store_plot(key, plot_url):
+    with plot_cache_lock:
+        plot_cache[key] = plot_url
+        plot_cache.move_to_end(key)
+        while len(plot_cache) > PLOT_CACHE_SIZE:
+            plot_cache.popitem(last=False)
+
+
+def render_clusters(name, k):
+    """
+    Runs K-Means (k clusters) on the named dataset and returns a 2D scatter
+    plot with cluster labels as a base64 PNG data URL. Results are cached on
+    the dataset's content hash, so a changed dataset file never serves a
+    stale plot.
+    """
+    dataset = open_dataset(name)
+    key = (name, dataset.digest, k)
+    plot_url = cached_plot(key)
+    if plot_url is not None:
+        return plot_url
+
+    X = dataset.X
+    if len(X) > FIT_MAX_SAMPLES:
+        # Sorted indices keep reads from the memory map sequential.
+        rng = np.random.default_rng(42)
+        idx = np.sort(rng.choice(len(X), FIT_MAX_SAMPLES, replace=False))
+        X_fit = X[idx]
+    else:
+        X_fit = X
+
+    kmeans = KMeans(n_clusters=k, random_state=42)
+    kmeans.fit(X_fit)
+
+    # We'll plot using the first two features (for Iris: sepal_length, sepal_width)
+    step = max(1, len(X) // PLOT_MAX_POINTS)
+    X_plot = X[::step]
+    labels = kmeans.predict(X_plot)
+    x_ = X_plot[:, 0]
+    y_ = X_plot[:, 1]
+
+    # Figure() rather than pyplot: no global state, so concurrent renders are safe
+    fig = Figure(figsize=(6, 4))
+    ax = fig.subplots()
+    scatter = ax.scatter(x_, y_, c=labels, cmap='viridis', s=40)
+    names = dataset.feature_names or ["Feature 1", "Feature 2"]
+    ax.set_xlabel(names[0])
+    ax.set_ylabel(names[1])
+    ax.set_title(f"K-Means Clusters (k={k})")
+
+    # Convert plot to base64
+    pngImage = io.BytesIO()
+    fig.savefig(pngImage, format='png', bbox_inches='tight')
+    pngImage.seek(0)
+
+    base64Image = base64.b64encode(pngImage.read()).decode('utf-8')
+    plot_url = "data:image/png;base64," + base64Image
+    store_plot(key, plot_url)
+    return plot_url
+
+
 @app.route('/plot_clusters', methods=['POST'])
 def plot_clusters():
     """
-    Endpoint: Takes a JSON with 'k'. Runs K-Means (k clusters) on Iris data,
-    plots a 2D scatter with cluster labels, returns base64 image data.
+    Endpoint: Takes a JSON with 'k' and an optional 'dataset' (default "iris").
+    Runs K-Means (k clusters) on that dataset, plots a 2D scatter with cluster
+    labels, returns base64 image data.
+    Over capacity, returns 503 with a Retry-After header.
     """
     try:
         data = request.get_json(force=True)
@@ -602,31 +701,97 @@ def plot_clusters():
         if k < 2 or k > 10:
             return jsonify({"error": "k must be between 2 and 10"}), 400
 
-        kmeans = KMeans(n_clusters=k, random_state=42)
-        kmeans.fit(X_iris)
-        labels = kmeans.labels_
+        name = data.get('dataset', 'iris')
+        # Cache hits are served without taking an admission slot. A dataset
+        # that isn't open yet (or changed on disk) is converted/hashed inside
+        # the admitted computation, never here.
+        # The single-flight key is (name, k); the content hash only needs to be
+        # in the plot cache key, which render_clusters handles.
+        dataset = current_dataset(name)
+        plot_url = cached_plot((name, dataset.digest, k)) if dataset else None
+        if plot_url is None:
+            plot_url = plot_admission.run((name, k),
+                                          lambda: render_clusters(name, k))
+        return jsonify({"plot_url": plot_url})
+    except Overloaded as e:
+        return (jsonify({"error": str(e)}), 503,
+                {"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
 
-        # We'll plot using the first two features: sepal_length, sepal_width
-        x_ = X_iris[:, 0]
-        y_ = X_iris[:, 1]
 
-        fig, ax = plt.subplots(figsize=(6, 4))
-        scatter = ax.scatter(x_, y_, c=labels, cmap='viridis', s=40)
-        ax.set_xlabel("Sepal Length")
-        ax.set_ylabel("Sepal Width")
-        ax.set_title(f"K-Means Clusters (k={k})")
+###############################################################################
+# HEALTH: liveness / readiness
+###############################################################################
+ready = threading.Event()
+warmup_status = {"error": None, "seconds": None}
 
-        # Convert plot to base64
-        pngImage = io.BytesIO()
-        plt.savefig(pngImage, format='png', bbox_inches='tight')
-        plt.close(fig)
-        pngImage.seek(0)
 
-        base64Image = base64.b64encode(pngImage.read()).decode('utf-8')
-        plot_url = "data:image/png;base64," + base64Image
-        return jsonify({"plot_url": plot_url})
+def warm_up():
+    """
+    Converts/opens every registered dataset, then runs one prediction per
+    model and one cluster plot so lazy sklearn / matplotlib initialization
+    happens before the first real request. Sets `ready` when done.
+    """
+    start = time.monotonic()
+    try:
+        for name in available_datasets():
+            open_dataset(name)
+
+        sample = np.array([[5.1, 3.5, 1.4, 0.2]])
+        model_bin1.predict(sample)
+        model_bin2.predict(sample)
+
+        # Same key as /plot_clusters, so it counts against the CPU limit and
+        # leaves k=3 cached.
+        # Being shed under load isn't a warm-up failure: wait and retry.
+        while True:
+            try:
+                plot_admission.run(("iris", 3), lambda: render_clusters("iris", 3))
+                break
+            except Overloaded as e:
+                time.sleep(e.retry_after)
+        ready.set()
     except Exception as e:
-        return jsonify({"error": str(e)}), 400
+        warmup_status["error"] = str(e)
+    warmup_status["seconds"] = round(time.monotonic() - start, 3)
+
+
+@app.route('/healthz')
+def healthz():
+    """
+    Liveness: the process is up and serving requests.
+    """
+    return jsonify({"status": "ok"})
+
+
+@app.route('/readyz')
+def readyz():
+    """
+    Readiness: models are loaded and warm-up has finished. 503 until then.
+    """
+    if ready.is_set():
+        return jsonify({"status": "ready", "warmup_seconds": warmup_status["seconds"]})
+    body = {"status": "warming_up"}
+    if warmup_status["error"]:
+        body = {"status": "failed", "error": warmup_status["error"]}
+    return jsonify(body), 503
+
+
+def start_warm_up():
+    """
+    Starts warm_up() in the background. Called when run as a script; a WSGI
+    entry point should call it explicitly, otherwise /readyz stays 503.
+    """
+    threading.Thread(target=warm_up, daemon=True).start()
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Endpoint: Admission-control metrics (queue depth, rejections, wait time).
+    """
+    return jsonify({"plot_clusters": plot_admission.metrics()})
 
 
 if __name__ == '__main__':
@@ -635,4 +800,5 @@ if __name__ == '__main__':
     python app.py
     -> open http://127.0.0.1:5000/
     """
+    start_warm_up()
     app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+from sklearn.datasets import load_digits, load_iris, load_wine
+
+# Converted datasets live here as <name>.npy (float32) plus <name>.sha256,
+# which records the digest with the .npy size and mtime it was computed for.
+DATA_DIR = os.environ.get("DATASET_DIR", "data")
+
+_loaders = {}
+_open = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+class Dataset:
+    """
+    A named dataset opened from the store.
+
+    `X` is a read-only float32 memory map, so every worker that opens the same
+    file shares the page cache instead of holding its own copy. `digest` is the
+    sha256 of the mapped contents and should be part of any cache key built
+    from this data.
+    """
+
+    def __init__(self, name, X, digest, feature_names, stat):
+        self.name = name
+        self.X = X
+        self.digest = digest
+        self.feature_names = feature_names
+        self.stat = stat
+
+
+def register_dataset(name, loader, feature_names=None):
+    """
+    Make a dataset available under `name`. `loader` is called once (the first
+    time the dataset is requested and no converted file exists) and must
+    return a 2D array-like of shape (n_samples, n_features). `feature_names`
+    may be a list or a callable returning one, so it is only loaded when the
+    dataset is opened.
+    """
+    _loaders[name] = (loader, feature_names)
+
+
+def available_datasets():
+    return sorted(_loaders)
+
+
+def _paths(name):
+    base = os.path.join(DATA_DIR, name)
+    return base + ".npy", base + ".sha256"
+
+
+def _file_stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def _hash_array(X):
+    return hashlib.sha256(np.ascontiguousarray(X).data).hexdigest()
+
+
+def _write_atomic(path, write):
+    # Write to a temp file and rename, so concurrent workers never see a
+    # half-written file.
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _convert(name):
+    """Run the loader and write it as a float32 .npy file."""
+    loader, _ = _loaders[name]
+    X = np.ascontiguousarray(loader(), dtype=np.float32)
+    if X.ndim != 2:
+        raise ValueError(f"Dataset '{name}' must be 2D, got shape {X.shape}")
+
+    npy_path, _ = _paths(name)
+    os.makedirs(DATA_DIR, exist_ok=True)
+    _write_atomic(npy_path, lambda f: np.save(f, X))
+
+
+def _recorded_digest(hash_path, stat):
+    """
+    Digest from the sidecar, if it was recorded for this exact .npy file
+    (same size and mtime); otherwise None and the caller re-hashes.
+    """
+    try:
+        with open(hash_path) as f:
+            digest, size, mtime_ns = f.read().split()
+        if (int(size), int(mtime_ns)) == stat:
+            return digest
+    except (FileNotFoundError, ValueError):
+        pass
+    return None
+
+
+def _check_name(name):
+    if name not in _loaders:
+        raise ValueError(f"Unknown dataset '{name}'. "
+                         f"Available: {', '.join(available_datasets())}")
+
+
+def current_dataset(name):
+    """
+    Return the already-opened Dataset for `name` if its .npy file is unchanged
+    on disk, else None. Never converts or hashes, so it is cheap enough to
+    call on every request.
+    """
+    _check_name(name)
+    dataset = _open.get(name)
+    if dataset is not None and dataset.stat == _file_stat(_paths(name)[0]):
+        return dataset
+    return None
+
+
+def open_dataset(name):
+    """
+    Return the Dataset for `name`, converting it on first use.
+
+    Opened datasets are cached per process and reopened when the .npy file's
+    size or mtime changes (e.g. another worker reconverted it). The digest is
+    read from the .sha256 sidecar when it was recorded for the file's current
+    size and mtime; otherwise it is computed from the mapped contents once and
+    recorded, so other workers don't have to read the whole file.
+    """
+    dataset = current_dataset(name)
+    if dataset is not None:
+        return dataset
+
+    with _locks_guard:
+        lock = _locks.setdefault(name, threading.Lock())
+
+    # Only callers of this dataset wait on the slow work below.
+    with lock:
+        dataset = current_dataset(name)
+        if dataset is not None:
+            return dataset
+
+        npy_path, hash_path = _paths(name)
+        if not os.path.exists(npy_path):
+            _convert(name)
+
+        # Re-stat after mapping so the stat (and any recorded digest matched
+        # against it) belongs to the file we actually mapped.
+        while True:
+            stat = _file_stat(npy_path)
+            X = np.load(npy_path, mmap_mode="r")
+            if _file_stat(npy_path) == stat:
+                break
+        digest = _recorded_digest(hash_path, stat)
+        if digest is None:
+            digest = _hash_array(X)
+            record = f"{digest} {stat[0]} {stat[1]}\n".encode()
+            _write_atomic(hash_path, lambda f: f.write(record))
+
+        _, feature_names = _loaders[name]
+        if callable(feature_names):
+            feature_names = list(feature_names())
+        dataset = Dataset(name, X, digest, feature_names, stat)
+        _open[name] = dataset
+        return dataset
+
+
+register_dataset("iris", lambda: load_iris().data,
+                 ["Sepal Length", "Sepal Width", "Petal Length", "Petal Width"])
+register_dataset("wine", lambda: load_wine().data,
+                 lambda: load_wine().feature_names)
+register_dataset("digits", lambda: load_digits().data,
+                 lambda: load_digits().feature_names)
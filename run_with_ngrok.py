@@ -1,32 +1,80 @@
+import json
 import subprocess
-import threading
-import time
 import sys
+import time
+import urllib.error
+import urllib.request
 from pyngrok import ngrok
+from IPython.display import HTML, display
 
 # Paste your token here
 ngrok.set_auth_token(" ")
 
-from pyngrok import ngrok
-import time
-import threading
-import subprocess
-from IPython.display import HTML
+READY_URL = "http://127.0.0.1:5000/readyz"
+READY_TIMEOUT = 120  # seconds
+
+
+def wait_until_ready(proc, url=READY_URL, timeout=READY_TIMEOUT):
+    """
+    Polls the app's readiness endpoint with exponential backoff until it
+    returns 200. Returns the seconds it took; raises if the app exits, reports
+    a failed warm-up, or the timeout passes first.
+    """
+    start = time.monotonic()
+    delay = 0.05
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app.py exited with code {proc.returncode}")
+        try:
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                if resp.status == 200:
+                    return time.monotonic() - start
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise
+            # 503 = still warming up, unless warm-up failed for good
+            try:
+                body = json.loads(e.read())
+            except ValueError:
+                body = {}
+            if body.get("status") == "failed":
+                raise RuntimeError(f"app warm-up failed: {body.get('error')}")
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass  # server not listening yet
+
+        elapsed = time.monotonic() - start
+        if elapsed > timeout:
+            raise TimeoutError(f"app not ready after {timeout}s")
+        time.sleep(min(delay, timeout - elapsed))
+        delay = min(delay * 2, 2.0)
+
+
+print("Starting Flask app...")
+app_proc = subprocess.Popen([sys.executable, "app.py"])
 
-def run_app():
-    print("Starting Flask app...")
-    subprocess.call(["python", "app.py"])
+# Whatever happens after this point (error, Ctrl+C, app exit), stop the app and
+# the tunnel so neither is left running.
+public_url = None
+try:
+    ready_seconds = wait_until_ready(app_proc)
+    print(f"App ready in {ready_seconds:.2f}s")
 
-thread = threading.Thread(target=run_app)
-thread.start()
+    public_url = ngrok.connect(5000)
+    print("Ngrok tunnel available at:", public_url.public_url)
 
-time.sleep(5)
-public_url = ngrok.connect(5000)
-print("Ngrok tunnel available at:", public_url.public_url)
+    # Create a clickable link in the Colab output
+    display(HTML(f"""
+    <a href="{public_url.public_url}" target="_blank" style="font-size:18px;">
+      Open your Apple-inspired Iris Predictor
+    </a>
+    """))
 
-# Create a clickable link in the Colab output
-HTML(f"""
-<a href="{public_url.public_url}" target="_blank" style="font-size:18px;">
-  Open your Apple-inspired Iris Predictor
-</a>
-""")
+    # Keep the tunnel open for as long as the app runs.
+    app_proc.wait()
+finally:
+    if public_url is not None:
+        ngrok.disconnect(public_url.public_url)
+    ngrok.kill()
+    if app_proc.poll() is None:
+        app_proc.terminate()
+        app_proc.wait()